@@ -2,29 +2,57 @@ import streamlit as st
 import sqlite3
 import datetime
 import bcrypt
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError
 import pandas as pd
 import re
-from transformers import pipeline
-from pytz import timezone
+from collections import deque
+from pathlib import Path
+import torch
+import queue
+import logging
+from time import sleep, monotonic
+from threading import Thread, Lock
+from concurrent.futures import Future
+from transformers import AutoTokenizer, AutoModelForCausalLM, LogitsProcessor, LogitsProcessorList
+from transformers.generation.streamers import BaseStreamer
+from transformers.pytorch_utils import Conv1D
+from zoneinfo import ZoneInfo
 
 # ===========================
 # Configuration & Initialization
 # ===========================
 st.set_page_config(page_title="AI Healthcare Assistant", page_icon="💬", layout="wide")
 
+PROFILE_PICS_DIR = Path("profile_pics")
+
 # ===========================
 # Database Setup
 # ===========================
 @st.cache_resource(show_spinner=False)
 def get_db_connection():
-    conn = sqlite3.connect("healthcare.db", check_same_thread=False)
+    # Prepared statements are reused from the connection's statement cache for every
+    # cursor (including pandas'), keyed by SQL text
+    conn = sqlite3.connect("healthcare.db", check_same_thread=False, cached_statements=256)
+    # Set before any cursor is created; cursors copy the factory at creation
+    conn.row_factory = sqlite3.Row
     cur = conn.cursor()
     
+    # WAL journal, relaxed fsync, 64MB page cache and mmap'd reads
+    try:
+        cur.executescript('''PRAGMA journal_mode=WAL;
+                             PRAGMA synchronous=NORMAL;
+                             PRAGMA cache_size=-65536;
+                             PRAGMA temp_store=MEMORY;
+                             PRAGMA mmap_size=268435456;''')
+    except sqlite3.OperationalError:
+        pass  # e.g. read-only filesystem, keep SQLite defaults
+    
     # Create tables
     cur.execute('''CREATE TABLE IF NOT EXISTS users (
                     id INTEGER PRIMARY KEY AUTOINCREMENT, 
                     username TEXT UNIQUE, 
-                    password BLOB, 
+                    password TEXT, 
                     email TEXT)''')
     
     cur.execute('''CREATE TABLE IF NOT EXISTS appointments (
@@ -51,82 +79,305 @@ def get_db_connection():
                     blood_type TEXT,
                     height INTEGER,
                     weight INTEGER,
-                    profile_picture BLOB)''')
+                    profile_picture_path TEXT)''')
+    
+    # Profile pictures live on disk; older databases only have the BLOB column
+    profile_columns = [row["name"] for row in cur.execute("PRAGMA table_info(profiles)")]
+    if "profile_picture_path" not in profile_columns:
+        cur.execute("ALTER TABLE profiles ADD COLUMN profile_picture_path TEXT")
+    if "profile_picture" in profile_columns:
+        # Move pictures saved by older versions out to disk
+        legacy_pictures = cur.execute("""SELECT username, profile_picture FROM profiles
+                                         WHERE profile_picture IS NOT NULL""").fetchall()
+        for row in legacy_pictures:
+            suffix = ".png" if row["profile_picture"].startswith(b"\x89PNG") else ".jpg"
+            picture_path = PROFILE_PICS_DIR / f"{row['username']}{suffix}"
+            PROFILE_PICS_DIR.mkdir(exist_ok=True)
+            picture_path.write_bytes(row["profile_picture"])
+            cur.execute("""UPDATE profiles SET profile_picture_path = ?, profile_picture = NULL
+                           WHERE username = ?""", (str(picture_path), row["username"]))
+    
+    # Per-patient lookups ordered by time
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_appt_patient_time ON appointments(patient_name, appointment_datetime)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_reminders_patient_time ON reminders(patient_name, reminder_time)")
     
     conn.commit()
-    return conn, cur
+    return conn
+
+conn = get_db_connection()
 
-conn, cur = get_db_connection()
+@st.cache_resource(show_spinner=False)
+def get_db_write_lock():
+    # Transactions belong to the shared connection, not to the session thread, so
+    # writes from different sessions must not interleave
+    return Lock()
+
+db_write_lock = get_db_write_lock()
+
+IST = ZoneInfo("Asia/Kolkata")
+UTC = ZoneInfo("UTC")
+TIMEZONES = {"Asia/Kolkata": IST}
+
+USERNAME_RE = re.compile(r"[A-Za-z0-9_]{3,20}")
+
+# Argon2id tuned to the OWASP 46 MiB / t=1 profile
+ph = PasswordHasher(time_cost=1, memory_cost=46 * 1024, parallelism=1)
 
 # ===========================
 # Core Functions
 # ===========================
 def signup(username, password, email):
-    if not re.match(r"^[A-Za-z0-9_]{3,20}$", username):
+    if not 3 <= len(username) <= 20 or not USERNAME_RE.fullmatch(username):
         return "❌ Invalid username (3-20 chars, alphanumeric)"
     
     try:
-        hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-        cur.execute("INSERT INTO users (username, password, email) VALUES (?, ?, ?)",
-                    (username, hashed, email))
-        conn.commit()
+        hashed = ph.hash(password)
+        with db_write_lock, conn:
+            conn.execute("INSERT INTO users (username, password, email) VALUES (?, ?, ?)",
+                         (username, hashed, email))
         return "✅ Signup successful!"
     except sqlite3.IntegrityError:
         return "❌ Username already exists!"
     except Exception as e:
         return f"❌ Signup error: {e}"
 
+def _update_password_hash(username, password):
+    hashed = ph.hash(password)  # outside the lock, hashing is deliberately slow
+    with db_write_lock, conn:
+        conn.execute("UPDATE users SET password = ? WHERE username = ?", (hashed, username))
+
 def login(username, password):
     try:
-        cur.execute("SELECT password FROM users WHERE username = ?", (username,))
-        result = cur.fetchone()
+        result = conn.execute("SELECT password FROM users WHERE username = ?", (username,)).fetchone()
         if result:
-            stored_hashed_pw = result[0]  # Ensure this is stored as bytes
-            if bcrypt.checkpw(password.encode('utf-8'), stored_hashed_pw):
+            stored_hashed_pw = result["password"]
+            if isinstance(stored_hashed_pw, bytes):
+                # Legacy bcrypt hash, upgraded to Argon2id on successful login
+                if bcrypt.checkpw(password.encode('utf-8'), stored_hashed_pw):
+                    _update_password_hash(username, password)
+                    return "✅ Login successful!"
+            else:
+                try:
+                    ph.verify(stored_hashed_pw, password)
+                except VerifyMismatchError:
+                    return "❌ Invalid credentials"
+                if ph.check_needs_rehash(stored_hashed_pw):
+                    _update_password_hash(username, password)
                 return "✅ Login successful!"
         return "❌ Invalid credentials"
     except Exception as e:
         return f"❌ Login error: {e}"
 
 
+MODEL_NAME = "distilgpt2"
+
+def _conv1d_to_linear(model):
+    # GPT-2 projections are transformers Conv1D (weight stored as in x out), which
+    # quantize_dynamic does not recognise; swap them for equivalent nn.Linear layers
+    for parent in list(model.modules()):
+        for name, child in parent.named_children():
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(parent, name, linear)
+    return model
+
 @st.cache_resource(show_spinner=False)
 def load_chatbot():
-    return pipeline("text-generation", model="distilgpt2", device=-1)
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    # GPT-2 has no pad token; pad on the left so batched prompts end where generation starts
+    tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.padding_side = "left"
+    # Over-long prompts keep their end, which is where generation continues
+    tokenizer.truncation_side = "left"
+    model = AutoModelForCausalLM.from_pretrained(MODEL_NAME, torch_dtype=torch.float32)
+    # int8 weights for every Linear layer (FBGEMM kernels on x86)
+    model = torch.ao.quantization.quantize_dynamic(_conv1d_to_linear(model), {torch.nn.Linear},
+                                                   dtype=torch.qint8)
+    model.eval()
+    # Compile forward (generate() calls it every decode step); dynamic shapes avoid a
+    # recompile per sequence length. Compilation is lazy, see warm_up_chatbot
+    model.forward = torch.compile(model.forward, dynamic=True)
+    return tokenizer, model
+
+tokenizer, model = load_chatbot()
+
+generation_kwargs = dict(max_new_tokens=64, do_sample=True, temperature=0.7, top_p=0.9,
+                         use_cache=True,
+                         eos_token_id=tokenizer.eos_token_id,
+                         pad_token_id=tokenizer.eos_token_id)
+
+REPETITION_PENALTY = 1.15
+MAX_PROMPT_TOKENS = model.config.n_positions - generation_kwargs["max_new_tokens"]
+MAX_BATCH_SIZE = 8
+BATCH_WINDOW = 0.03  # seconds to wait for more prompts before generating
+
+class _PaddedRepetitionPenalty(LogitsProcessor):
+    # Same as transformers' repetition_penalty, but ignores each row's left padding.
+    # The pad token is EOS, so the stock processor would penalise EOS only in padded
+    # rows and make reply length depend on which prompts were batched together
+    def __init__(self, penalty, pad_lengths):
+        self.penalty = penalty
+        self.pad_lengths = pad_lengths
+
+    def __call__(self, input_ids, scores):
+        positions = torch.arange(input_ids.shape[1], device=input_ids.device)
+        is_prompt_or_reply = positions[None, :] >= self.pad_lengths[:, None]
+        # Point pad positions at the row's first real token so scatter sees no conflicting ids
+        first_token = input_ids.gather(1, self.pad_lengths.clamp(max=input_ids.shape[1] - 1)[:, None])
+        token_ids = torch.where(is_prompt_or_reply, input_ids, first_token)
+        score = scores.gather(1, token_ids)
+        score = torch.where(score < 0, score * self.penalty, score / self.penalty)
+        return scores.scatter(1, token_ids, score)
+
+class _BatchTextStreamer(BaseStreamer):
+    # generate() emits the prompt ids first, then one token per batch row each step;
+    # each row is decoded into its request's Future.partial_text for the Chat tab to show
+    def __init__(self, futures):
+        self.futures = futures
+        self.token_ids = None
+
+    def put(self, value):
+        if self.token_ids is None:
+            self.token_ids = [[] for _ in self.futures]
+            return
+        for ids, future, token_id in zip(self.token_ids, self.futures, value.reshape(-1).tolist()):
+            ids.append(token_id)
+            future.partial_text = tokenizer.decode(ids, skip_special_tokens=True)
+
+    def end(self):
+        pass
+
+def _run_generate(inputs, futures):
+    streamer = _BatchTextStreamer(futures) if futures else None
+    pad_lengths = (inputs["attention_mask"] == 0).sum(dim=1)
+    logits_processor = LogitsProcessorList([_PaddedRepetitionPenalty(REPETITION_PENALTY, pad_lengths)])
+    with torch.inference_mode():
+        return model.generate(**inputs, **generation_kwargs, logits_processor=logits_processor,
+                              streamer=streamer)
 
-chatbot = load_chatbot()
+def _generate(prompts, futures=None):
+    # Truncate so one long prompt cannot overflow the position embeddings and fail the batch
+    inputs = tokenizer(prompts, padding=True, truncation=True, max_length=MAX_PROMPT_TOKENS,
+                       return_tensors="pt")
+    try:
+        output = _run_generate(inputs, futures)
+    except Exception as e:
+        if "forward" not in vars(model):  # already eager, a real generation error
+            raise
+        # torch.compile can also fail on a later (re)compile, not just the warm-up
+        logging.getLogger(__name__).warning("torch.compile failed, using eager forward: %s", e)
+        del model.forward  # drop the compiled instance attribute, back to Module.forward
+        output = _run_generate(inputs, futures)
+    return tokenizer.batch_decode(output[:, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+
+def _chatbot_worker(requests):
+    # Collect prompts from all sessions for up to BATCH_WINDOW and generate them as one batch
+    while True:
+        batch = [requests.get()]
+        deadline = monotonic() + BATCH_WINDOW
+        while len(batch) < MAX_BATCH_SIZE:
+            try:
+                batch.append(requests.get(timeout=max(deadline - monotonic(), 0)))
+            except queue.Empty:
+                break
+        try:
+            responses = _generate([prompt for prompt, _ in batch], [future for _, future in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+        else:
+            for (_, future), response in zip(batch, responses):
+                future.set_result(response)
+
+@st.cache_resource(show_spinner=False)
+def warm_up_chatbot():
+    # torch.compile specializes batch size 1 and compiles lazily, so run the real
+    # settings once as a padded batch and once alone before the first chat message
+    _generate(["I have had a headache and a mild fever since yesterday.", "Hello"])
+    _generate(["Hello, what should I do about a sore throat?"])
+
+warm_up_chatbot()
+
+@st.cache_resource(show_spinner=False)
+def get_chatbot_queue():
+    # Single worker thread owns the model, so generation runs off the script thread
+    requests = queue.Queue()
+    Thread(target=_chatbot_worker, args=(requests,), daemon=True).start()
+    return requests
+
+chatbot_queue = get_chatbot_queue()
 
 def healthcare_chatbot(user_input):
+    # Queue the prompt for the background worker and return its Future;
+    # partial_text holds the reply generated so far
+    future = Future()
+    future.partial_text = ""
+    chatbot_queue.put((user_input, future))
+    return future
+
+def chatbot_response(future):
     disclaimer = "⚠️ This is not medical advice."
     try:
-        # Generate response from the chatbot
-        response = chatbot(user_input, max_length=200, temperature=0.7)[0]['generated_text']
-        return f"{response}\n\n⚠️ {disclaimer}"
+        return f"{future.result()}\n\n⚠️ {disclaimer}"
     except Exception as e:
         return f"Error: {str(e)}"
 
 # ===========================
 # Appointment Functions
 # ===========================
+@st.cache_data(ttl=30, show_spinner=False)
+def get_appointments(username):
+    # Stored as UTC ISO strings, which sort chronologically and can use the index
+    df = pd.read_sql_query("""SELECT id AS "Appointment ID", doctor_name AS "Doctor",
+                           appointment_datetime AS "Date/Time (UTC)"
+                           FROM appointments WHERE patient_name = ?
+                           ORDER BY appointment_datetime""",
+                           conn, params=(username,),
+                           # Rows can differ in precision (e.g. microseconds)
+                           parse_dates={"Date/Time (UTC)": {"format": "ISO8601"}})
+    df["Date/Time (UTC)"] = df["Date/Time (UTC)"].dt.strftime('%Y-%m-%d %H:%M')
+    return df
+
+def _appointment_row(patient_name, doctor_name, appointment_datetime):
+    if appointment_datetime.tzinfo is None:
+        appointment_datetime = appointment_datetime.replace(tzinfo=IST)
+    
+    utc_time = appointment_datetime.astimezone(UTC)
+    return (patient_name, doctor_name, utc_time.isoformat())
+
 def book_appointment(patient_name, doctor_name, appointment_datetime):
     try:
-        if appointment_datetime.tzinfo is None:
-            appointment_datetime = timezone('Asia/Kolkata').localize(appointment_datetime)
-        
-        utc_time = appointment_datetime.astimezone(timezone('UTC'))
-        
-        cur.execute("""INSERT INTO appointments 
-                    (patient_name, doctor_name, appointment_datetime)
-                    VALUES (?, ?, ?)""",
-                    (patient_name, doctor_name, utc_time.isoformat()))
-        conn.commit()
+        with db_write_lock, conn:
+            conn.execute("""INSERT INTO appointments 
+                         (patient_name, doctor_name, appointment_datetime)
+                         VALUES (?, ?, ?)""",
+                         _appointment_row(patient_name, doctor_name, appointment_datetime))
+        get_appointments.clear()
         return "✅ Appointment booked!"
     except Exception as e:
         return f"❌ Error: {e}"
 
+def book_appointments_bulk(rows):
+    # rows: iterable of (patient_name, doctor_name, appointment_datetime), committed as one transaction
+    try:
+        with db_write_lock, conn:
+            conn.executemany("""INSERT INTO appointments 
+                             (patient_name, doctor_name, appointment_datetime)
+                             VALUES (?, ?, ?)""",
+                             (_appointment_row(*row) for row in rows))
+        get_appointments.clear()
+        return "✅ Appointments booked!"
+    except Exception as e:
+        return f"❌ Error: {e}"
+
 def delete_appointment(appointment_id):
     try:
-        cur.execute("DELETE FROM appointments WHERE id = ?", (appointment_id,))
-        conn.commit()
+        with db_write_lock, conn:
+            conn.execute("DELETE FROM appointments WHERE id = ?", (appointment_id,))
+        get_appointments.clear()
         return "✅ Appointment deleted!"
     except Exception as e:
         return f"❌ Error: {e}"
@@ -134,22 +385,36 @@ def delete_appointment(appointment_id):
 # ===========================
 # Medicine Reminder Functions
 # ===========================
+@st.cache_data(ttl=30, show_spinner=False)
+def get_reminders(username):
+    df = pd.read_sql_query("""SELECT id AS "Reminder ID", medication AS "Medication",
+                           reminder_time AS "Reminder Time (IST)"
+                           FROM reminders WHERE patient_name = ?
+                           ORDER BY reminder_time""",
+                           conn, params=(username,),
+                           # Rows can differ in precision (e.g. microseconds)
+                           parse_dates={"Reminder Time (IST)": {"format": "ISO8601"}})
+    df["Reminder Time (IST)"] = df["Reminder Time (IST)"].dt.strftime('%Y-%m-%d %H:%M')
+    return df
+
 def set_medicine_reminder(patient_name, medication, reminder_time):
     try:
-        india_time = reminder_time.astimezone(timezone('Asia/Kolkata'))  # Convert to India Standard Time (IST)
-        cur.execute("""INSERT INTO reminders 
-                    (patient_name, medication, reminder_time) 
-                    VALUES (?, ?, ?)""",
-                    (patient_name, medication, india_time.isoformat()))
-        conn.commit()
+        india_time = reminder_time.astimezone(IST)  # Convert to India Standard Time (IST)
+        with db_write_lock, conn:
+            conn.execute("""INSERT INTO reminders 
+                         (patient_name, medication, reminder_time) 
+                         VALUES (?, ?, ?)""",
+                         (patient_name, medication, india_time.isoformat()))
+        get_reminders.clear()
         return "✅ Medicine reminder set!"
     except Exception as e:
         return f"❌ Error: {e}"
 
 def delete_medicine_reminder(reminder_id):
     try:
-        cur.execute("DELETE FROM reminders WHERE id = ?", (reminder_id,))
-        conn.commit()
+        with db_write_lock, conn:
+            conn.execute("DELETE FROM reminders WHERE id = ?", (reminder_id,))
+        get_reminders.clear()
         return "✅ Medicine reminder deleted!"
     except Exception as e:
         return f"❌ Error: {e}"
@@ -162,7 +427,8 @@ if "logged_in" not in st.session_state:
 if "username" not in st.session_state:
     st.session_state.username = ""
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    # Only the most recent messages are kept and re-rendered on each rerun
+    st.session_state.messages = deque(maxlen=40)
 
 # Authentication Sidebar
 with st.sidebar:
@@ -193,17 +459,19 @@ with st.sidebar:
                         st.session_state.username = username
                     st.success(msg)
 
+@st.cache_data(ttl=300, show_spinner=False)
 def get_profile_picture(username):
-    cur.execute("SELECT profile_picture FROM profiles WHERE username = ?", (username,))
-    result = cur.fetchone()
-    if result and result[0]:  # If picture exists
-        return result[0]  # Binary data
+    result = conn.execute("SELECT profile_picture_path FROM profiles WHERE username = ?",
+                          (username,)).fetchone()
+    if result and result["profile_picture_path"] and Path(result["profile_picture_path"]).exists():
+        return result["profile_picture_path"]  # Path on disk
     return None
 
 # Display Profile Picture
-image_data = get_profile_picture(st.session_state.username)
-if image_data:
-    st.image(image_data, caption="Profile Picture", use_column_width=True)
+if st.session_state.logged_in:
+    image_path = get_profile_picture(st.session_state.username)
+    if image_path:
+        st.image(image_path, caption="Profile Picture", use_column_width=True)
 
 
 # Main App Interface
@@ -213,15 +481,28 @@ if st.session_state.logged_in:
     with tabs[0]:  # Chat Tab
         st.header("AI Healthcare Assistant")
 
-        prompt = st.chat_input("Your message...")
+        # Collect a finished reply first so the input below is enabled on this run
+        future = st.session_state.get("pending_future")
+        if future is not None and future.done():
+            st.session_state.messages.append({"role": "assistant", "content": chatbot_response(future)})
+            del st.session_state.pending_future
+
+        prompt = st.chat_input("Your message...", disabled="pending_future" in st.session_state)
         if prompt:
-            with st.spinner("Generating response..."):
-                response = healthcare_chatbot(prompt)
-            st.session_state.messages.append(f"**You:** {prompt}")
-            st.session_state.messages.append(f"**AI:** {response}")
+            st.session_state.messages.append({"role": "user", "content": prompt})
+            st.session_state.pending_future = healthcare_chatbot(prompt)
 
         for msg in st.session_state.messages:
-            st.markdown(msg)
+            with st.chat_message(msg["role"]):
+                st.markdown(msg["content"])
+
+        if "pending_future" in st.session_state:
+            partial_text = st.session_state.pending_future.partial_text
+            if partial_text:
+                with st.chat_message("assistant"):
+                    st.markdown(partial_text)
+            else:
+                st.status("Generating response...", state="running")
     
     with tabs[1]:  # Appointments
         st.header("Manage Appointments")
@@ -235,27 +516,18 @@ if st.session_state.logged_in:
             # Combine date and time into a single datetime object
             dt = datetime.datetime.combine(date, time)
 
-            tz = st.selectbox("Timezone", ["Asia/Delhi"])
+            tz = st.selectbox("Timezone", list(TIMEZONES))
             
             if st.form_submit_button("Book Appointment"):
-                tz_obj = timezone(tz)
-                localized_dt = tz_obj.localize(dt)
+                localized_dt = dt.replace(tzinfo=TIMEZONES[tz])
                 msg = book_appointment(st.session_state.username, doc, localized_dt)
                 st.success(msg)
 
         # Display upcoming appointments
-        cur.execute("""SELECT id, doctor_name, datetime(appointment_datetime) 
-                     FROM appointments WHERE patient_name = ?
-                     ORDER BY datetime(appointment_datetime)""",
-                     (st.session_state.username,))
-        appointments = cur.fetchall()
-        if appointments:
+        df = get_appointments(st.session_state.username)
+        if not df.empty:
             st.subheader("Upcoming Appointments")
-            # Convert the string datetime to datetime object
-            appointments = [(appointment_id, doctor, datetime.datetime.fromisoformat(appointment)) 
-                            for appointment_id, doctor, appointment in appointments]
-            df = pd.DataFrame(appointments, columns=["Appointment ID", "Doctor", "Date/Time (UTC)"])
-            st.dataframe(df.style.format({"Date/Time (UTC)": lambda x: x.strftime('%Y-%m-%d %H:%M')}))
+            st.dataframe(df)
             
             # Delete appointment functionality
             appointment_id_to_delete = st.number_input("Enter Appointment ID to delete", min_value=1, step=1)
@@ -268,15 +540,10 @@ if st.session_state.logged_in:
         st.header("Medicine Reminder")
         
         # Show reminders
-        cur.execute("""SELECT id, medication, reminder_time FROM reminders WHERE patient_name = ? ORDER BY reminder_time""",
-                     (st.session_state.username,))
-        reminders = cur.fetchall()
-        if reminders:
+        df = get_reminders(st.session_state.username)
+        if not df.empty:
             st.subheader("Your Medicine Reminders")
-            reminders = [(reminder_id, medication, datetime.datetime.fromisoformat(reminder_time)) 
-                         for reminder_id, medication, reminder_time in reminders]
-            df = pd.DataFrame(reminders, columns=["Reminder ID", "Medication", "Reminder Time (IST)"])
-            st.dataframe(df.style.format({"Reminder Time (IST)": lambda x: x.strftime('%Y-%m-%d %H:%M')}))
+            st.dataframe(df)
         
         # Delete reminder functionality
         reminder_id_to_delete = st.number_input("Enter Reminder ID to delete", min_value=1, step=1)
@@ -302,11 +569,24 @@ if st.session_state.logged_in:
         uploaded_file = st.file_uploader("Upload Profile Picture", type=["jpg", "jpeg", "png"])
         if uploaded_file is not None:
             st.image(uploaded_file, caption="Uploaded Image", use_column_width=True)
-            profile_picture = uploaded_file.read()
-            # Save to database
-            cur.execute("INSERT OR REPLACE INTO profiles (username, profile_picture) VALUES (?, ?)",
-                        (st.session_state.username, profile_picture))
-            conn.commit()
+            # The uploader keeps its file across reruns; only save a new upload once
+            if st.session_state.get("saved_picture_id") != uploaded_file.file_id:
+                suffix = Path(uploaded_file.name).suffix.lower()
+                picture_path = PROFILE_PICS_DIR / f"{st.session_state.username}{suffix}"
+                previous = conn.execute("SELECT profile_picture_path FROM profiles WHERE username = ?",
+                                        (st.session_state.username,)).fetchone()
+                PROFILE_PICS_DIR.mkdir(exist_ok=True)
+                picture_path.write_bytes(uploaded_file.getvalue())
+                # Save path to database
+                with db_write_lock, conn:
+                    conn.execute("""INSERT INTO profiles (username, profile_picture_path) VALUES (?, ?)
+                                 ON CONFLICT(username) DO UPDATE SET profile_picture_path = excluded.profile_picture_path""",
+                                 (st.session_state.username, str(picture_path)))
+                # A different file type means a different file name; remove the old one
+                if previous and previous["profile_picture_path"] not in (None, str(picture_path)):
+                    Path(previous["profile_picture_path"]).unlink(missing_ok=True)
+                get_profile_picture.clear()
+                st.session_state.saved_picture_id = uploaded_file.file_id
         
         # Profile Information Form
         with st.form("profile_form"):
@@ -321,15 +601,26 @@ if st.session_state.logged_in:
 
             if st.form_submit_button("Save Profile"):
                 try:
-                    cur.execute("""
-                        INSERT OR REPLACE INTO profiles 
-                        (username, full_name, age, medical_history, allergies, medications, blood_type, height, weight)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, 
-                    (st.session_state.username, full_name, age, medical_history, allergies, medications, blood_type, height, weight))
-                    conn.commit()
+                    # Upsert so the stored profile picture path is kept
+                    with db_write_lock, conn:
+                        conn.execute("""
+                            INSERT INTO profiles 
+                            (username, full_name, age, medical_history, allergies, medications, blood_type, height, weight)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                            ON CONFLICT(username) DO UPDATE SET
+                            full_name = excluded.full_name, age = excluded.age,
+                            medical_history = excluded.medical_history, allergies = excluded.allergies,
+                            medications = excluded.medications, blood_type = excluded.blood_type,
+                            height = excluded.height, weight = excluded.weight
+                        """, 
+                        (st.session_state.username, full_name, age, medical_history, allergies, medications, blood_type, height, weight))
                     st.success("Profile Updated Successfully!")
                 except Exception as e:
                     st.error(f"Error: {str(e)}")
 else:
-    st.warning("⚠️ Please do log in to continue with the app.")
\ No newline at end of file
+    st.warning("⚠️ Please do log in to continue with the app.")
+
+# Poll the background chatbot worker once the whole page has rendered
+if st.session_state.logged_in and "pending_future" in st.session_state:
+    sleep(0.1)
+    st.rerun()
\ No newline at end of file